@@ -2,8 +2,8 @@ from fastapi import APIRouter, BackgroundTasks, HTTPException
 from pydantic import BaseModel
 import urllib.parse
 
-from app.modules.orchestrator import process_url
-from app.database.mongo import db
+from app.database.mongo import get_profiles_collection
+from app.modules.host_health import get_host_health, reset_host
 
 router = APIRouter()
 
@@ -16,6 +16,10 @@ async def trigger_scrape(request: ScrapeRequest, background_tasks: BackgroundTas
     Triggers a background data extraction job.
     Returns 202 Accepted immediately. Check GET /profile later.
     """
+    # The pipeline (BeautifulSoup, lxml, tinycss2, ...) is loaded on the first scrape,
+    # keeping API startup and idle replicas light
+    from app.modules.orchestrator import process_url
+
     background_tasks.add_task(process_url, request.url)
     return {
         "status": "Accepted", 
@@ -33,11 +37,12 @@ async def get_profile(url: str):
     decoded_url = urllib.parse.unquote(url)
     
     # query MongoDB
-    profile = db["profiles"].find_one({"source_url": decoded_url})
+    profiles = get_profiles_collection()
+    profile = profiles.find_one({"source_url": decoded_url})
     
     if not profile:
         # Fallback check stripping trailing slash
-        profile = db["profiles"].find_one({"source_url": decoded_url.rstrip('/')})
+        profile = profiles.find_one({"source_url": decoded_url.rstrip('/')})
         
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found. Is it still processing or was the URL invalid?")
@@ -47,3 +52,26 @@ async def get_profile(url: str):
         profile["_id"] = str(profile["_id"])
         
     return profile
+
+@router.get("/hosts/health")
+async def list_host_health():
+    """
+    Circuit breaker state, error counts and latency percentiles for every host
+    this API process has crawled.
+    """
+    return {"hosts": get_host_health()}
+
+@router.get("/hosts/health/{host}")
+async def host_health_detail(host: str):
+    """Breaker state for a single host, e.g. /hosts/health/stripe.com"""
+    health = get_host_health(host)
+    if not health:
+        raise HTTPException(status_code=404, detail="No health data for this host yet.")
+    return health
+
+@router.delete("/hosts/health/{host}")
+async def reset_host_health(host: str):
+    """Manually close a host's circuit breaker and forget its latency history."""
+    if not reset_host(host):
+        raise HTTPException(status_code=404, detail="No health data for this host yet.")
+    return {"status": "reset", "host": host}
@@ -16,3 +16,35 @@ USER_AGENT = os.getenv(
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
     "(KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
 )
+
+# Branding: external stylesheet analysis
+STYLESHEET_MAX_COUNT = int(os.getenv("STYLESHEET_MAX_COUNT", 10))
+STYLESHEET_MAX_BYTES = int(os.getenv("STYLESHEET_MAX_BYTES", 512 * 1024))
+STYLESHEET_TIMEOUT = int(os.getenv("STYLESHEET_TIMEOUT", 10))
+STYLESHEET_WORKERS = int(os.getenv("STYLESHEET_WORKERS", 6))
+STYLESHEET_CACHE_SIZE = int(os.getenv("STYLESHEET_CACHE_SIZE", 512))
+STYLESHEET_CACHE_TTL = int(os.getenv("STYLESHEET_CACHE_TTL", 3600))
+STYLESHEET_RAW_CACHE_MB = int(os.getenv("STYLESHEET_RAW_CACHE_MB", 64))
+STYLESHEET_FAILURE_TTL = int(os.getenv("STYLESHEET_FAILURE_TTL", 300))
+
+# Raw-page snapshot store (for offline reprocessing)
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "false").lower() in ("1", "true", "yes")
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_ZSTD_LEVEL = int(os.getenv("SNAPSHOT_ZSTD_LEVEL", 10))
+SNAPSHOT_MAX_AGE_DAYS = int(os.getenv("SNAPSHOT_MAX_AGE_DAYS", 30))
+SNAPSHOT_MAX_PER_URL = int(os.getenv("SNAPSHOT_MAX_PER_URL", 3))
+SNAPSHOT_MAX_TOTAL_MB = int(os.getenv("SNAPSHOT_MAX_TOTAL_MB", 2048))
+SNAPSHOT_PRUNE_EVERY = int(os.getenv("SNAPSHOT_PRUNE_EVERY", 50))
+
+# Per-host health: circuit breaker, adaptive timeouts, retry budgets
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_COOLDOWN = int(os.getenv("BREAKER_COOLDOWN", 300))
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", 50))
+ADAPTIVE_TIMEOUT_MIN = float(os.getenv("ADAPTIVE_TIMEOUT_MIN", 3))
+ADAPTIVE_TIMEOUT_MULTIPLIER = float(os.getenv("ADAPTIVE_TIMEOUT_MULTIPLIER", 3))
+RETRY_BUDGET_TIMEOUT = int(os.getenv("RETRY_BUDGET_TIMEOUT", 1))
+RETRY_BUDGET_CONNECTION = int(os.getenv("RETRY_BUDGET_CONNECTION", 0))
+RETRY_BUDGET_SERVER_ERROR = int(os.getenv("RETRY_BUDGET_SERVER_ERROR", 2))
+RETRY_BUDGET_BROWSER_ERROR = int(os.getenv("RETRY_BUDGET_BROWSER_ERROR", 1))
+HOST_HEALTH_MAX_HOSTS = int(os.getenv("HOST_HEALTH_MAX_HOSTS", 1000))
+HOST_HEALTH_IDLE_COOLDOWNS = int(os.getenv("HOST_HEALTH_IDLE_COOLDOWNS", 12))
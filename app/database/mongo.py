@@ -1,11 +1,31 @@
-from pymongo import MongoClient
 from app.config import MONGO_URI, MONGO_DB_NAME
 from loguru import logger
 from datetime import datetime
 
-client = MongoClient(MONGO_URI)
-db = client[MONGO_DB_NAME]
-profiles_collection = db["profiles"]
+# The client is created on first use instead of at import time, so processes
+# that never touch the database (or only import the app) don't pay for it.
+_client = None
+
+def get_client():
+    """Return the shared MongoClient, creating it on first call."""
+    global _client
+    if _client is None:
+        from pymongo import MongoClient
+        _client = MongoClient(MONGO_URI)
+    return _client
+
+def get_db():
+    return get_client()[MONGO_DB_NAME]
+
+def get_profiles_collection():
+    return get_db()["profiles"]
+
+def close_client():
+    """Close the shared client if one was created (called on API shutdown)."""
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
 
 def save_profile(url: str, data: dict):
     """Save or update the extracted data to database."""
@@ -14,7 +34,7 @@ def save_profile(url: str, data: dict):
         data['scraped_at'] = datetime.utcnow()
         
         # Upsert: Update if the record exists, else Create
-        result = profiles_collection.update_one(
+        result = get_profiles_collection().update_one(
             {"source_url": url},
             {"$set": data},
             upsert=True
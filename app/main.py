@@ -1,10 +1,20 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.api.routes import router
+from app.database.mongo import close_client
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Heavy clients (MongoDB, Groq, Playwright) are created lazily on first use;
+    # here we only make sure they are released on shutdown.
+    yield
+    close_client()
 
 app = FastAPI(
     title="Website Data Extraction API",
     description="A powerful AI pipeline extracting highly structured branding and contact blueprints from any URL.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Connect all the routes
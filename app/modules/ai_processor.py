@@ -1,21 +1,29 @@
 import json
-from openai import OpenAI
 from loguru import logger
 from app.config import GROQ_API_KEY
 
-client = None
-if GROQ_API_KEY:
-    client = OpenAI(
-        api_key=GROQ_API_KEY,
-        base_url="https://api.groq.com/openai/v1",
-    )
-else:
-    logger.warning("No GROQ_API_KEY found. AI functions will fail.")
+# The OpenAI SDK is heavy to import; build the client on first use only.
+_client = None
+
+def get_client():
+    """Return the shared Groq (OpenAI-compatible) client, or None without an API key."""
+    global _client
+    if _client is None:
+        if not GROQ_API_KEY:
+            logger.warning("No GROQ_API_KEY found. AI functions will fail.")
+            return None
+        from openai import OpenAI
+        _client = OpenAI(
+            api_key=GROQ_API_KEY,
+            base_url="https://api.groq.com/openai/v1",
+        )
+    return _client
 
 def analyze_business_profile(title: str, description: str, raw_text: str) -> dict:
     """Uses Gemini to clean, summarize, classify text, and extract services."""
     logger.info("Sending raw text to Groq for intelligent extraction...")
     
+    client = get_client()
     if not client:
         logger.error("Skipping AI step — no API key provided.")
         return {}
@@ -1,12 +1,409 @@
 import io
 import re
+import time
+import hashlib
+import threading
+import urllib.parse
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from colorthief import ColorThief
+import tinycss2
 from bs4 import BeautifulSoup
 from loguru import logger
+from app.config import (
+    USER_AGENT,
+    STYLESHEET_MAX_COUNT,
+    STYLESHEET_MAX_BYTES,
+    STYLESHEET_TIMEOUT,
+    STYLESHEET_WORKERS,
+    STYLESHEET_CACHE_SIZE,
+    STYLESHEET_CACHE_TTL,
+    STYLESHEET_RAW_CACHE_MB,
+    STYLESHEET_FAILURE_TTL,
+)
 
-def enhance_branding(html: str, logo_url: str = None) -> dict:
-    """Extracts fonts from HTML and color palette from a given logo image URL."""
+# Generic families and CSS-wide keywords are never a brand font
+GENERIC_FONTS = {
+    "serif", "sans-serif", "monospace", "cursive", "fantasy", "system-ui",
+    "ui-serif", "ui-sans-serif", "ui-monospace", "ui-rounded", "emoji", "math",
+    "-apple-system", "blinkmacsystemfont", "inherit", "initial", "unset", "revert",
+}
+
+# Properties whose values carry colors (custom properties are checked separately)
+COLOR_PROPERTIES = {"background", "border", "fill", "stroke", "outline"}
+
+# Parsed stylesheet analyses, shared across jobs. Framework/CDN CSS is identical
+# on thousands of sites, so results are keyed by content hash, with a URL index
+# so recently seen stylesheet URLs are not even re-downloaded.
+_analysis_cache = OrderedDict()  # sha256 -> {"fonts": Counter, "colors": Counter}
+_url_index = OrderedDict()       # url -> (fetched_at, sha256, or None if the fetch failed)
+# Raw bodies are only needed when snapshotting; kept under a byte budget so
+# repeat stylesheet URLs can be stored without downloading them again.
+_raw_cache = OrderedDict()       # sha256 -> (bytes, charset)
+_raw_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+def _fresh_url_digest(url: str) -> str:
+    """
+    Digest of a URL's last fetched content, if still within STYLESHEET_CACHE_TTL (lock held).
+    Failed fetches are remembered for STYLESHEET_FAILURE_TTL and return None.
+    """
+    entry = _url_index.get(url)
+    if not entry:
+        return None
+    fetched_at, digest = entry
+    ttl = STYLESHEET_CACHE_TTL if digest else STYLESHEET_FAILURE_TTL
+    if time.monotonic() - fetched_at > ttl:
+        _url_index.pop(url, None)
+        return None
+    _url_index.move_to_end(url)
+    return digest
+
+def _recently_failed(url: str) -> bool:
+    """True if fetching this URL failed within STYLESHEET_FAILURE_TTL."""
+    with _cache_lock:
+        _fresh_url_digest(url)  # drops the entry once expired
+        entry = _url_index.get(url)
+        return entry is not None and entry[1] is None
+
+def _cache_failure(url: str):
+    """Remember a failed fetch, so a dead stylesheet shared by many sites isn't retried on every job."""
+    with _cache_lock:
+        _url_index[url] = (time.monotonic(), None)
+        _url_index.move_to_end(url)
+        while len(_url_index) > STYLESHEET_CACHE_SIZE * 4:
+            _url_index.popitem(last=False)
+
+def _cache_get_url(url: str):
+    with _cache_lock:
+        digest = _fresh_url_digest(url)
+        if digest is None or digest not in _analysis_cache:
+            return None
+        _analysis_cache.move_to_end(digest)
+        return _analysis_cache[digest]
+
+def _raw_get_url(url: str):
+    """Cached (bytes, charset) for a recently fetched stylesheet URL, or None."""
+    with _cache_lock:
+        digest = _fresh_url_digest(url)
+        raw = _raw_cache.get(digest) if digest else None
+        if raw is not None:
+            _raw_cache.move_to_end(digest)
+        return raw
+
+def _raw_put(digest: str, body: bytes, charset: str):
+    global _raw_cache_bytes
+    with _cache_lock:
+        if digest in _raw_cache:
+            _raw_cache.move_to_end(digest)
+            return
+        _raw_cache[digest] = (body, charset)
+        _raw_cache_bytes += len(body)
+        while _raw_cache and _raw_cache_bytes > STYLESHEET_RAW_CACHE_MB * 1024 * 1024:
+            _old_digest, (old_body, _old_charset) = _raw_cache.popitem(last=False)
+            _raw_cache_bytes -= len(old_body)
+
+def _cache_get_digest(digest: str):
+    with _cache_lock:
+        analysis = _analysis_cache.get(digest)
+        if analysis is not None:
+            _analysis_cache.move_to_end(digest)
+        return analysis
+
+def _cache_put(url: str, digest: str, analysis: dict):
+    with _cache_lock:
+        _analysis_cache[digest] = analysis
+        _analysis_cache.move_to_end(digest)
+        if url:
+            _url_index[url] = (time.monotonic(), digest)
+            _url_index.move_to_end(url)
+        while len(_analysis_cache) > STYLESHEET_CACHE_SIZE:
+            _analysis_cache.popitem(last=False)
+        while len(_url_index) > STYLESHEET_CACHE_SIZE * 4:
+            _url_index.popitem(last=False)
+
+def _normalize_hex(value: str) -> str:
+    """Turn a CSS hash value (#rgb, #rgba, #rrggbb, #rrggbbaa) into #rrggbb."""
+    value = value.lower()
+    if not re.fullmatch(r"[0-9a-f]+", value):
+        return None
+    if len(value) in (3, 4):
+        return "#" + "".join(c * 2 for c in value[:3])
+    if len(value) in (6, 8):
+        return "#" + value[:6]
+    return None
+
+def _rgb_function_to_hex(token) -> str:
+    """Convert an rgb()/rgba() function token into #rrggbb."""
+    channels = []
+    for arg in token.arguments:
+        if arg.type == "number":
+            channels.append(arg.value)
+        elif arg.type == "percentage":
+            channels.append(arg.value * 2.55)
+        if len(channels) == 3:
+            break
+    if len(channels) < 3:
+        return None
+    return '#%02x%02x%02x' % tuple(max(0, min(255, round(c))) for c in channels)
+
+def _collect_colors(tokens, colors: Counter):
+    for token in tokens:
+        if token.type == "hash":
+            color = _normalize_hex(token.value)
+            if color:
+                colors[color] += 1
+        elif token.type == "function":
+            if token.lower_name in ("rgb", "rgba"):
+                color = _rgb_function_to_hex(token)
+                if color:
+                    colors[color] += 1
+            else:
+                # e.g. linear-gradient(#fff, #000) or var(--brand, #635bff)
+                _collect_colors(token.arguments, colors)
+
+def _first_font_family(tokens) -> str:
+    """Return the first family name of a font-family value, or None."""
+    words = []
+    for token in tokens:
+        if token.type in ("whitespace", "comment"):
+            continue
+        if token.type == "literal" and token.value == ",":
+            break
+        if token.type == "string":
+            return token.value.strip() or None
+        if token.type == "ident":
+            words.append(token.value)
+        else:
+            # var(), !important leftovers etc. — not a literal family name
+            return None
+    return " ".join(words) or None
+
+def _analyze_declarations(declarations, result: dict):
+    for decl in declarations:
+        if decl.type != "declaration":
+            continue
+        name = decl.lower_name
+        if name == "font-family":
+            family = _first_font_family(decl.value)
+            if family and family.lower() not in GENERIC_FONTS and len(family) < 40:
+                result["fonts"][family] += 1
+        elif name.startswith("--") or "color" in name or name.split("-")[0] in COLOR_PROPERTIES:
+            _collect_colors(decl.value, result["colors"])
+
+def _analyze_rules(rules, result: dict):
+    for rule in rules:
+        if rule.type == "qualified-rule" or (rule.type == "at-rule" and rule.lower_at_keyword == "font-face"):
+            if rule.content is None:
+                continue
+            _analyze_declarations(
+                tinycss2.parse_declaration_list(rule.content, skip_comments=True, skip_whitespace=True),
+                result,
+            )
+        elif rule.type == "at-rule" and rule.content is not None:
+            # @media / @supports / @layer blocks contain nested rules
+            _analyze_rules(
+                tinycss2.parse_rule_list(rule.content, skip_comments=True, skip_whitespace=True),
+                result,
+            )
+
+def analyze_css(css: str) -> dict:
+    """Tokenize a stylesheet and count font-family and color occurrences."""
+    result = {"fonts": Counter(), "colors": Counter()}
+    rules = tinycss2.parse_stylesheet(css, skip_comments=True, skip_whitespace=True)
+    _analyze_rules(rules, result)
+    return result
+
+def analyze_css_bytes(body: bytes, charset: str = None) -> dict:
+    """
+    Same as analyze_css for a raw stylesheet body. Decoding follows the CSS spec
+    (BOM, then the Content-Type charset, then @charset, then UTF-8), unlike
+    requests' ISO-8859-1 default for text/* responses without a charset.
+    """
+    result = {"fonts": Counter(), "colors": Counter()}
+    rules, _encoding = tinycss2.parse_stylesheet_bytes(
+        body, protocol_encoding=charset, skip_comments=True, skip_whitespace=True
+    )
+    _analyze_rules(rules, result)
+    return result
+
+def _content_type_charset(content_type: str) -> str:
+    """Extract the charset parameter of a Content-Type header, if any."""
+    match = re.search(r'charset\s*=\s*["\']?([\w.:-]+)', content_type or "", re.IGNORECASE)
+    return match.group(1) if match else None
+
+def _fetch_stylesheet(url: str) -> tuple:
+    """
+    Download a stylesheet, reading at most STYLESHEET_MAX_BYTES. Returns (raw bytes, charset or None).
+    requests' timeout only bounds each socket read, so the whole download also gets a
+    STYLESHEET_TIMEOUT wall-clock deadline; a host trickling bytes can't hold the worker.
+    """
+    headers = {"User-Agent": USER_AGENT, "Accept": "text/css,*/*;q=0.1"}
+    deadline = time.monotonic() + STYLESHEET_TIMEOUT
+    with requests.get(url, headers=headers, timeout=STYLESHEET_TIMEOUT, verify=False, stream=True) as response:
+        response.raise_for_status()
+
+        declared_size = response.headers.get("Content-Length")
+        if declared_size and declared_size.isdigit() and int(declared_size) > STYLESHEET_MAX_BYTES:
+            logger.debug(f"Stylesheet {url} is {declared_size} bytes; reading only the first {STYLESHEET_MAX_BYTES}.")
+
+        body = bytearray()
+        for chunk in response.iter_content(chunk_size=16384):
+            body.extend(chunk)
+            if len(body) >= STYLESHEET_MAX_BYTES:
+                del body[STYLESHEET_MAX_BYTES:]
+                break
+            if time.monotonic() > deadline:
+                raise requests.exceptions.Timeout(f"Stylesheet download exceeded {STYLESHEET_TIMEOUT}s")
+
+        return bytes(body), _content_type_charset(response.headers.get("Content-Type"))
+
+def analyze_stylesheet_body(body: bytes, charset: str = None, url: str = None) -> dict:
+    """Analyze a raw stylesheet body, reusing a cached result for identical content."""
+    digest = hashlib.sha256(body).hexdigest()
+    analysis = _cache_get_digest(digest)
+    if analysis is None:
+        try:
+            analysis = analyze_css_bytes(body, charset)
+        except Exception as e:
+            logger.warning(f"Failed to parse stylesheet {url or digest[:12]}: {e}")
+            return None
+    else:
+        logger.debug(f"Stylesheet cache hit (content): {url or digest[:12]}")
+
+    _cache_put(url, digest, analysis)
+    return analysis
+
+def analyze_stylesheet_url(url: str) -> dict:
+    """Fetch and analyze one external stylesheet, going through the shared cache."""
+    cached = _cache_get_url(url)
+    if cached is not None:
+        logger.debug(f"Stylesheet cache hit (url): {url}")
+        return cached
+    if _recently_failed(url):
+        logger.debug(f"Skipping recently failed stylesheet: {url}")
+        return None
+
+    try:
+        body, charset = _fetch_stylesheet(url)
+    except Exception as e:
+        logger.warning(f"Failed to fetch stylesheet {url}: {e}")
+        _cache_failure(url)
+        return None
+
+    return analyze_stylesheet_body(body, charset, url)
+
+def fetch_stylesheets(urls: list) -> dict:
+    """
+    Concurrently download raw stylesheets, returning {url: (bytes, charset)} for the ones
+    that succeeded. URLs fetched within STYLESHEET_CACHE_TTL are served from memory.
+    """
+    def fetch(url):
+        cached = _raw_get_url(url)
+        if cached is not None:
+            logger.debug(f"Stylesheet cache hit (raw): {url}")
+            return url, cached
+        if _recently_failed(url):
+            logger.debug(f"Skipping recently failed stylesheet: {url}")
+            return url, None
+        try:
+            body, charset = _fetch_stylesheet(url)
+            _raw_put(hashlib.sha256(body).hexdigest(), body, charset)
+            return url, (body, charset)
+        except Exception as e:
+            logger.warning(f"Failed to fetch stylesheet {url}: {e}")
+            _cache_failure(url)
+            return url, None
+
+    if not urls:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(STYLESHEET_WORKERS, len(urls)))) as pool:
+        return {url: fetched for url, fetched in pool.map(fetch, urls) if fetched is not None}
+
+def find_stylesheet_urls(soup: BeautifulSoup, base_url: str = None) -> list:
+    """Collect absolute URLs of <link rel="stylesheet"> tags, capped at STYLESHEET_MAX_COUNT."""
+    urls = []
+    for link in soup.find_all("link", href=True):
+        rel = [r.lower() for r in (link.get("rel") or [])]
+        if "stylesheet" not in rel:
+            continue
+        href = link.get("href").strip()
+        # Google Fonts CSS is already covered by the family= parameters
+        if "fonts.googleapis.com/css" in href:
+            continue
+        absolute = urllib.parse.urljoin(base_url or "", href)
+        if absolute.startswith(("http://", "https://")) and absolute not in urls:
+            urls.append(absolute)
+    return urls[:STYLESHEET_MAX_COUNT]
+
+def analyze_stylesheets(soup: BeautifulSoup, base_url: str = None, stylesheets: dict = None) -> dict:
+    """
+    Concurrently fetch linked stylesheets and merge them with inline <style>/style="" CSS.
+    If `stylesheets` ({url: (bytes, charset)}) is given, those bodies are used and nothing is fetched.
+    """
+    totals = {"fonts": Counter(), "colors": Counter()}
+
+    urls = find_stylesheet_urls(soup, base_url)
+    if stylesheets is not None:
+        for url in urls:
+            analysis = analyze_stylesheet_body(*stylesheets[url], url=url) if url in stylesheets else None
+            if analysis:
+                totals["fonts"].update(analysis["fonts"])
+                totals["colors"].update(analysis["colors"])
+    elif urls:
+        logger.info(f"Analyzing {len(urls)} external stylesheet(s)...")
+        with ThreadPoolExecutor(max_workers=max(1, min(STYLESHEET_WORKERS, len(urls)))) as pool:
+            for analysis in pool.map(analyze_stylesheet_url, urls):
+                if analysis:
+                    totals["fonts"].update(analysis["fonts"])
+                    totals["colors"].update(analysis["colors"])
+
+    # Embedded <style> blocks
+    for style in soup.find_all("style"):
+        css = style.string or style.get_text()
+        if css:
+            analysis = analyze_css(css)
+            totals["fonts"].update(analysis["fonts"])
+            totals["colors"].update(analysis["colors"])
+
+    # Inline style="" attributes
+    for tag in soup.find_all(style=True):
+        declarations = tinycss2.parse_declaration_list(tag["style"], skip_comments=True, skip_whitespace=True)
+        _analyze_declarations(declarations, totals)
+
+    return totals
+
+def _is_neutral(hex_color: str) -> bool:
+    """White, black and greys say little about a brand."""
+    r, g, b = (int(hex_color[i:i + 2], 16) for i in (1, 3, 5))
+    return max(r, g, b) - min(r, g, b) < 16
+
+def fetch_logo(logo_url: str) -> bytes:
+    """Download the logo image, returning its raw bytes (None on failure)."""
+    try:
+        headers = {"User-Agent": "Mozilla/5.0"}
+        response = requests.get(logo_url, headers=headers, timeout=10, verify=False)
+        response.raise_for_status()
+        return response.content
+    except Exception as e:
+        logger.error(f"Failed to download logo {logo_url}: {e}")
+        return None
+
+def fetch_branding_assets(html: str, logo_url: str = None, base_url: str = None) -> tuple:
+    """Download the logo bytes and linked stylesheets enhance_branding would use, e.g. for snapshotting."""
+    soup = BeautifulSoup(html, "lxml")
+    stylesheets = fetch_stylesheets(find_stylesheet_urls(soup, base_url))
+    # b"" rather than None on failure, so enhance_branding doesn't retry the download
+    logo_bytes = (fetch_logo(logo_url) if logo_url else None) or b""
+    return logo_bytes, stylesheets
+
+def enhance_branding(html: str, logo_url: str = None, base_url: str = None,
+                     logo_bytes: bytes = None, stylesheets: dict = None) -> dict:
+    """
+    Extracts fonts and colors from HTML/CSS and color palette from a given logo image URL.
+    Pre-fetched `logo_bytes` and `stylesheets` ({url: (bytes, charset)}) are used instead of downloading,
+    which lets snapshots be reprocessed offline (pass b"" for "no logo, don't fetch").
+    """
     branding = {
         "primary_color": None,
         "color_palette": [],
@@ -17,7 +414,7 @@ def enhance_branding(html: str, logo_url: str = None) -> dict:
     # 1. Extract Fonts from HTML
     soup = BeautifulSoup(html, "lxml")
     fonts_found = []
-    
+
     # Try getting fonts from Google Fonts links
     for link in soup.find_all("link", href=True):
         href = link.get("href")
@@ -28,44 +425,48 @@ def enhance_branding(html: str, logo_url: str = None) -> dict:
                 clean_name = m.replace("+", " ")
                 if clean_name not in fonts_found:
                     fonts_found.append(clean_name)
-                    
-    # Also extract from inline/embedded CSS simply using regex
-    inline_fonts = re.findall(r'font-family:\s*([^;\}]+)', html, re.IGNORECASE)
-    for f in inline_fonts:
-        parts = f.split(",")
-        if parts:
-            first_font = parts[0].strip().strip("'").strip('"')
-            # very basic filter to avoid CSS junk
-            if len(first_font) < 25 and "{" not in first_font:
-                fonts_found.append(first_font)
-                
+
+    # Then external stylesheets plus embedded/inline CSS, most used first
+    css_data = analyze_stylesheets(soup, base_url, stylesheets)
+    for font, _count in css_data["fonts"].most_common():
+        fonts_found.append(font)
+
     # Deduplicate and keep the top 3 core fonts
     fonts_found = list(dict.fromkeys(fonts_found))[:3]
     branding["fonts"] = fonts_found
 
     # 2. Extract Colors from Logo Image using ColorThief
-    if logo_url:
+    if logo_bytes is None and logo_url:
+        logo_bytes = fetch_logo(logo_url)
+
+    if logo_bytes:
         try:
             logger.info(f"Extracting color palette from logo image: {logo_url}")
-            headers = {"User-Agent": "Mozilla/5.0"}
-            response = requests.get(logo_url, headers=headers, timeout=10, verify=False)
-            response.raise_for_status()
-            
-            # Load into ColorThief
-            image_stream = io.BytesIO(response.content)
+
+            # Load into ColorThief (imported lazily, it pulls in Pillow)
+            from colorthief import ColorThief
+            image_stream = io.BytesIO(logo_bytes)
             color_thief = ColorThief(image_stream)
-            
+
             # Get dominant (primary) brand color
             dominant_color_rgb = color_thief.get_color(quality=1)
             branding["primary_color"] = '#%02x%02x%02x' % dominant_color_rgb
-            
+
             # Get complementary color palette
             palette_rgb = color_thief.get_palette(color_count=5, quality=1)
             branding["color_palette"] = ['#%02x%02x%02x' % rgb for rgb in palette_rgb]
-            
+
             logger.success("Brand colors extracted successfully!")
-            
+
         except Exception as e:
             logger.error(f"Failed to extract colors from logo: {e}")
 
+    # 3. Fall back to the most frequent CSS colors when the logo gave us nothing
+    if not branding["color_palette"] and css_data["colors"]:
+        css_colors = [color for color, _count in css_data["colors"].most_common()]
+        brand_colors = [c for c in css_colors if not _is_neutral(c)]
+        branding["primary_color"] = branding["primary_color"] or (brand_colors or css_colors)[0]
+        branding["color_palette"] = (brand_colors + [c for c in css_colors if _is_neutral(c)])[:5]
+        logger.info("Brand colors derived from stylesheet frequencies.")
+
     return branding
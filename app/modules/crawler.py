@@ -1,14 +1,30 @@
 import requests
-from bs4 import BeautifulSoup
 from loguru import logger
 import time
-from playwright.async_api import async_playwright
+from app.modules import host_health
 from app.config import CRAWL_DELAY, USER_AGENT, REQUEST_TIMEOUT, MAX_RETRIES
 
 def ensure_delay():
     """Simple blocking delay to respect CRAWL_DELAY."""
     time.sleep(CRAWL_DELAY)
 
+def _http_error_class(status: int) -> str:
+    """5xx and 429 are worth retrying; other 4xx are not."""
+    return host_health.SERVER_ERROR if status >= 500 or status == 429 else host_health.CLIENT_ERROR
+
+def _playwright_error_class(error: Exception) -> str:
+    """Chromium network errors (net::ERR_*) are the host's; anything else is the browser's."""
+    return host_health.CONNECTION if "net::ERR_" in str(error) else host_health.BROWSER_ERROR
+
+def _may_retry(error_class: str, retries_used: dict) -> bool:
+    """Spend one retry from the budget of this error class, if any is left."""
+    retries_used[error_class] = retries_used.get(error_class, 0) + 1
+    return retries_used[error_class] <= host_health.retry_budget(error_class)
+
+def _circuit_open_result(host: str, url: str) -> dict:
+    logger.warning(f"Circuit open for {host}; failing fast on {url}.")
+    return {"success": False, "error": f"Circuit open for {host}", "status_code": None}
+
 def static_crawl(url: str, retries: int = MAX_RETRIES) -> dict:
     """Fetch HTML content using static requests."""
     headers = {
@@ -17,78 +33,139 @@ def static_crawl(url: str, retries: int = MAX_RETRIES) -> dict:
         "Accept-Language": "en-US,en;q=0.9",
         "Connection": "keep-alive",
     }
-    
+
+    host = host_health.host_of(url)
+    if not host_health.allow_request(host):
+        return _circuit_open_result(host, url)
+
+    retries_used = {}
+    last_error_class = None
+    result = {"success": False, "error": "Max retries exceeded", "status_code": None}
+
     for attempt in range(retries):
         ensure_delay()
+        # Adaptive timeout from the host's latency history; a retry after a timeout gets the full one
+        timeout = REQUEST_TIMEOUT if last_error_class == host_health.TIMEOUT else host_health.get_timeout(host)
+        start = time.monotonic()
         try:
-            logger.info(f"Crawling {url} (Attempt {attempt+1}/{retries})...")
-            response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT, verify=False)
-            
+            logger.info(f"Crawling {url} (Attempt {attempt+1}/{retries}, timeout {timeout}s)...")
+            response = requests.get(url, headers=headers, timeout=timeout, verify=False)
+
             # Raise exception for bad status codes
             response.raise_for_status()
-            
+
+            host_health.record_success(host, time.monotonic() - start)
             logger.success(f"Successfully fetched {url}")
             return {"success": True, "html": response.text, "status": response.status_code, "url": response.url}
-            
+
         except requests.exceptions.HTTPError as e:
-            logger.error(f"HTTP error occurred: {e}. Status code: {e.response.status_code}")
-            return {"success": False, "error": str(e), "status_code": e.response.status_code}
-            
+            status = e.response.status_code
+            logger.error(f"HTTP error occurred: {e}. Status code: {status}")
+            last_error_class = _http_error_class(status)
+            last_error = str(e)
+            result = {"success": False, "error": last_error, "status_code": status}
+
         except requests.exceptions.Timeout as e:
             logger.warning(f"Timeout occurred: {e}")
-            
+            last_error_class, last_error = host_health.TIMEOUT, str(e)
+            result = {"success": False, "error": last_error, "status_code": None}
+
         except requests.exceptions.RequestException as e:
             logger.error(f"Request exception: {e}")
-            break # Break on serious connection problems, don't retry endlessly
+            last_error_class, last_error = host_health.CONNECTION, str(e)
+            result = {"success": False, "error": last_error, "status_code": None}
+
+        host_health.record_failure(host, last_error_class, last_error)
+        if not _may_retry(last_error_class, retries_used):
+            break
+        if not host_health.allow_request(host):
+            return _circuit_open_result(host, url)
 
-    logger.error(f"Failed to fetch {url} after {retries} attempts.")
-    return {"success": False, "error": "Max retries exceeded", "status_code": None}
+    logger.error(f"Failed to fetch {url}; retry budget for {last_error_class} errors exhausted.")
+    return result
 
 async def dynamic_crawl(url: str, retries: int = MAX_RETRIES) -> dict:
     """Fetch HTML content using Playwright headless browser for JS-rendered apps."""
-    for attempt in range(retries):
-        ensure_delay()
-        try:
-            logger.info(f"Dynamically crawling {url} JS app (Attempt {attempt+1}/{retries})...")
-            
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(headless=True)
-                # Setting up a context that mimics a real user session to avoid blocks
-                context = await browser.new_context(
-                    user_agent=USER_AGENT,
-                    viewport={"width": 1920, "height": 1080},
-                    ignore_https_errors=True
-                )
-                
-                page = await context.new_page()
-                
-                # We wait until the network is idle to ensure JS framework data finishes fetching
-                response = await page.goto(url, wait_until="networkidle", timeout=REQUEST_TIMEOUT * 1000)
-                
-                if not response:
-                    await browser.close()
-                    continue
-                    
-                status = response.status
-                
-                if status >= 400:
-                    logger.error(f"HTTP error {status} during dynamic crawl.")
-                    await browser.close()
-                    return {"success": False, "error": f"HTTP {status}", "status_code": status}
-                
-                # Fetching the final rendered HTML
-                html = await page.content()
-                final_url = page.url
-                
+    # Imported here so the API and static-only workers never load Playwright
+    from playwright.async_api import async_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+    host = host_health.host_of(url)
+    if not host_health.allow_request(host):
+        return _circuit_open_result(host, url)
+
+    retries_used = {}
+    last_error_class = None
+    result = {"success": False, "error": "Max retries exceeded", "status_code": None}
+
+    try:
+        async with async_playwright() as p:
+            # One browser for all attempts; only the page context is recreated per retry
+            browser = await p.chromium.launch(headless=True)
+            try:
+                for attempt in range(retries):
+                    ensure_delay()
+                    timeout = REQUEST_TIMEOUT if last_error_class == host_health.TIMEOUT else host_health.get_timeout(host, "dynamic")
+                    logger.info(f"Dynamically crawling {url} JS app (Attempt {attempt+1}/{retries}, timeout {timeout}s)...")
+
+                    # Setting up a context that mimics a real user session to avoid blocks
+                    context = await browser.new_context(
+                        user_agent=USER_AGENT,
+                        viewport={"width": 1920, "height": 1080},
+                        ignore_https_errors=True
+                    )
+                    start = time.monotonic()
+                    try:
+                        page = await context.new_page()
+
+                        # We wait until the network is idle to ensure JS framework data finishes fetching
+                        response = await page.goto(url, wait_until="networkidle", timeout=timeout * 1000)
+
+                        if not response:
+                            last_error_class = host_health.CONNECTION
+                            result = {"success": False, "error": "No response", "status_code": None}
+                        elif response.status >= 400:
+                            status = response.status
+                            logger.error(f"HTTP error {status} during dynamic crawl.")
+                            last_error_class = _http_error_class(status)
+                            result = {"success": False, "error": f"HTTP {status}", "status_code": status}
+                        else:
+                            # Fetching the final rendered HTML
+                            html = await page.content()
+                            final_url = page.url
+                            host_health.record_success(host, time.monotonic() - start, "dynamic")
+                            logger.success(f"Successfully dynamically fetched {final_url}")
+                            return {"success": True, "html": html, "status": response.status, "url": final_url}
+
+                    except PlaywrightTimeoutError as e:
+                        logger.warning(f"Timeout dynamically rendering {url}: {e}")
+                        last_error_class = host_health.TIMEOUT
+                        result = {"success": False, "error": "Timeout", "status_code": None}
+
+                    except PlaywrightError as e:
+                        logger.warning(f"Error dynamically rendering {url}: {e}")
+                        last_error_class = _playwright_error_class(e)
+                        result = {"success": False, "error": str(e), "status_code": None}
+
+                    finally:
+                        await context.close()
+
+                    host_health.record_failure(host, last_error_class, result["error"])
+                    if not _may_retry(last_error_class, retries_used):
+                        break
+                    if not host_health.allow_request(host):
+                        return _circuit_open_result(host, url)
+            finally:
                 await browser.close()
-                logger.success(f"Successfully dynamically fetched {final_url}")
-                return {"success": True, "html": html, "status": status, "url": final_url}
-                
-        except Exception as e:
-            logger.warning(f"Error dynamically rendering {url}: {e}")
-            
-    logger.error(f"Failed to dynamically render {url} after {retries} attempts.")
-    return {"success": False, "error": "Max retries exceeded", "status_code": None}
+
+    except Exception as e:
+        # Browser launch / driver failures are our problem, not the host's: if this
+        # crawl held the half-open probe, give it back instead of wedging the breaker
+        logger.error(f"Playwright failed while rendering {url}: {e}")
+        host_health.release_probe(host)
+        return {"success": False, "error": str(e), "status_code": None}
+
+    logger.error(f"Failed to dynamically render {url}; retry budget for {last_error_class} errors exhausted.")
+    return result
 
 def has_js_framework(html: str) -> bool:
     """Detect if the page heavily relies on JS (React, Vue, Next.js)."""
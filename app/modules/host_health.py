@@ -0,0 +1,223 @@
+import time
+import threading
+import urllib.parse
+from collections import deque, OrderedDict
+from loguru import logger
+from app.config import (
+    REQUEST_TIMEOUT,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_COOLDOWN,
+    LATENCY_WINDOW,
+    ADAPTIVE_TIMEOUT_MIN,
+    ADAPTIVE_TIMEOUT_MULTIPLIER,
+    RETRY_BUDGET_TIMEOUT,
+    RETRY_BUDGET_CONNECTION,
+    RETRY_BUDGET_SERVER_ERROR,
+    RETRY_BUDGET_BROWSER_ERROR,
+    HOST_HEALTH_MAX_HOSTS,
+    HOST_HEALTH_IDLE_COOLDOWNS,
+)
+
+# Error classes used by the crawler
+TIMEOUT = "timeout"
+CONNECTION = "connection"
+SERVER_ERROR = "server_error"   # 5xx / 429
+CLIENT_ERROR = "client_error"   # other 4xx: the host is up, retrying won't help
+BROWSER_ERROR = "browser_error" # Playwright-side failure (crashed page, closed target): says nothing about the host
+
+RETRY_BUDGETS = {
+    TIMEOUT: RETRY_BUDGET_TIMEOUT,
+    CONNECTION: RETRY_BUDGET_CONNECTION,
+    SERVER_ERROR: RETRY_BUDGET_SERVER_ERROR,
+    CLIENT_ERROR: 0,
+    BROWSER_ERROR: RETRY_BUDGET_BROWSER_ERROR,
+}
+
+# Breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Fewer samples than this and we stick with the static REQUEST_TIMEOUT
+MIN_LATENCY_SAMPLES = 5
+
+class HostHealth:
+    """Circuit breaker and latency window for a single host (per process)."""
+
+    def __init__(self, host: str):
+        self.host = host
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.probe_started_at = None
+        self.latencies = {"static": deque(maxlen=LATENCY_WINDOW), "dynamic": deque(maxlen=LATENCY_WINDOW)}
+        self.errors = {TIMEOUT: 0, CONNECTION: 0, SERVER_ERROR: 0, CLIENT_ERROR: 0, BROWSER_ERROR: 0}
+        self.successes = 0
+        self.last_error = None
+        self.last_seen = time.monotonic()
+
+    def percentile(self, mode: str, pct: float) -> float:
+        samples = sorted(self.latencies[mode])
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def to_dict(self) -> dict:
+        retry_in = None
+        if self.state == OPEN:
+            retry_in = max(0.0, round(self.opened_at + BREAKER_COOLDOWN - time.monotonic(), 1))
+        return {
+            "host": self.host,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_seconds": retry_in,
+            "successes": self.successes,
+            "errors": dict(self.errors),
+            "last_error": self.last_error,
+            "latency": {
+                mode: {
+                    "samples": len(self.latencies[mode]),
+                    "p50": self.percentile(mode, 50),
+                    "p95": self.percentile(mode, 95),
+                    "timeout": _adaptive_timeout(self, mode),
+                }
+                for mode in self.latencies
+            },
+        }
+
+_hosts = OrderedDict()  # host -> HostHealth, least recently used first
+_lock = threading.Lock()
+
+def host_of(url: str) -> str:
+    return urllib.parse.urlparse(url).netloc.lower()
+
+def _evict():
+    """
+    Drop hosts idle for HOST_HEALTH_IDLE_COOLDOWNS x BREAKER_COOLDOWN (an open breaker only
+    once its cooldown has passed), then least recently used closed hosts beyond
+    HOST_HEALTH_MAX_HOSTS. Active breakers are kept while closed hosts can make room; if
+    they alone exceed the cap, the least recently used of them go too.
+    """
+    now = time.monotonic()
+    idle_cutoff = now - HOST_HEALTH_IDLE_COOLDOWNS * BREAKER_COOLDOWN
+    # Never the newest entry: that is the host _get is about to hand out
+    candidates = list(_hosts)[:-1]
+    for host in candidates:
+        health = _hosts[host]
+        idle = health.last_seen < idle_cutoff
+        if not idle and len(_hosts) <= HOST_HEALTH_MAX_HOSTS:
+            break
+        if health.state == CLOSED or (idle and now - health.opened_at >= BREAKER_COOLDOWN):
+            del _hosts[host]
+
+    # Hard cap, so a flood of failing hosts can't grow the table without bound
+    for host in candidates:
+        if len(_hosts) <= HOST_HEALTH_MAX_HOSTS:
+            break
+        if host in _hosts:
+            logger.warning(f"Host health table full; dropping breaker state for {host}.")
+            del _hosts[host]
+
+def _get(host: str) -> HostHealth:
+    health = _hosts.get(host)
+    if health is None:
+        health = _hosts[host] = HostHealth(host)
+        _evict()
+    else:
+        _hosts.move_to_end(host)
+        health.last_seen = time.monotonic()
+    return health
+
+def _adaptive_timeout(health: HostHealth, mode: str) -> float:
+    p95 = health.percentile(mode, 95)
+    if p95 is None or len(health.latencies[mode]) < MIN_LATENCY_SAMPLES:
+        return float(REQUEST_TIMEOUT)
+    return round(min(float(REQUEST_TIMEOUT), max(ADAPTIVE_TIMEOUT_MIN, p95 * ADAPTIVE_TIMEOUT_MULTIPLIER)), 2)
+
+def get_timeout(host: str, mode: str = "static") -> float:
+    """Timeout (seconds) derived from the host's observed p95 latency, capped at REQUEST_TIMEOUT."""
+    with _lock:
+        health = _hosts.get(host)
+        return _adaptive_timeout(health, mode) if health else float(REQUEST_TIMEOUT)
+
+def allow_request(host: str) -> bool:
+    """False while the host's breaker is open; after the cooldown a single probe is let through."""
+    with _lock:
+        # Unknown hosts are only tracked once a result is recorded
+        health = _hosts.get(host)
+        if health is None or health.state == CLOSED:
+            return True
+        if health.state == OPEN and time.monotonic() - health.opened_at >= BREAKER_COOLDOWN:
+            health.state = HALF_OPEN
+            health.probe_in_flight = False
+        # A probe that never reported back (e.g. its worker died) must not wedge the breaker
+        probe_stale = health.probe_in_flight and time.monotonic() - health.probe_started_at >= BREAKER_COOLDOWN
+        if health.state == HALF_OPEN and (not health.probe_in_flight or probe_stale):
+            health.probe_in_flight = True
+            health.probe_started_at = time.monotonic()
+            logger.info(f"Circuit half-open for {host}; sending a probe request.")
+            return True
+        return False
+
+def release_probe(host: str):
+    """
+    Hand back a half-open probe that never reached the host (e.g. the browser failed to
+    launch), so the next request can probe right away instead of after a full cooldown.
+    """
+    with _lock:
+        health = _hosts.get(host)
+        if health is not None and health.state == HALF_OPEN:
+            health.probe_in_flight = False
+
+def record_success(host: str, latency: float, mode: str = "static"):
+    with _lock:
+        health = _get(host)
+        health.latencies[mode].append(latency)
+        health.successes += 1
+        health.consecutive_failures = 0
+        health.probe_in_flight = False
+        if health.state != CLOSED:
+            logger.success(f"Circuit closed for {host}.")
+        health.state = CLOSED
+        health.opened_at = None
+
+def record_failure(host: str, error_class: str, error: str = None):
+    with _lock:
+        health = _get(host)
+        health.errors[error_class] = health.errors.get(error_class, 0) + 1
+        health.last_error = error
+        health.probe_in_flight = False
+        if error_class == BROWSER_ERROR:
+            # Not the host's fault: no penalty, and a half-open breaker just awaits the next probe
+            return
+        if error_class == CLIENT_ERROR:
+            # The host answered; a 404/403 means it is up, not unhealthy
+            health.consecutive_failures = 0
+            health.state = CLOSED
+            health.opened_at = None
+            return
+        health.consecutive_failures += 1
+        if health.state == HALF_OPEN or health.consecutive_failures >= BREAKER_FAILURE_THRESHOLD:
+            if health.state != OPEN:
+                logger.warning(f"Circuit opened for {host} after {health.consecutive_failures} consecutive failures.")
+            health.state = OPEN
+            health.opened_at = time.monotonic()
+
+def retry_budget(error_class: str) -> int:
+    """How many extra attempts an error of this class may use."""
+    return RETRY_BUDGETS.get(error_class, 0)
+
+def get_host_health(host: str = None):
+    """Breaker/latency state for one host, or all tracked hosts if `host` is None."""
+    with _lock:
+        if host is not None:
+            health = _hosts.get(host.lower())
+            return health.to_dict() if health else None
+        return [health.to_dict() for health in _hosts.values()]
+
+def reset_host(host: str) -> bool:
+    """Forget everything known about a host (closes its breaker)."""
+    with _lock:
+        return _hosts.pop(host.lower(), None) is not None
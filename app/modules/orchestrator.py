@@ -6,9 +6,11 @@ from app.modules.validator import validate_target
 from app.modules.crawler import static_crawl, dynamic_crawl, has_js_framework
 from app.modules.parser import parse_html
 from app.modules.ai_processor import analyze_business_profile
-from app.modules.branding import enhance_branding
+from app.modules.branding import enhance_branding, fetch_branding_assets
+from app.modules.snapshot import save_snapshot
 from app.database.mongo import save_profile
 from app.models.profile import ScrapedProfile
+from app.config import SNAPSHOT_ENABLED
 
 async def process_url(url: str) -> dict:
     """Core pipeline. Returns dict with success/error."""
@@ -43,7 +45,17 @@ async def process_url(url: str) -> dict:
             logger.error("Dynamic crawl failed. Falling back to static HTML.")
     else:
         logger.info("Static HTML detected. Proceeding instantly.")
-        
+
+    return process_html(normalized_url, html, final_url, is_dynamic, capture_snapshot=SNAPSHOT_ENABLED)
+
+def process_html(normalized_url: str, html: str, final_url: str, is_dynamic: bool,
+                 capture_snapshot: bool = False, logo_bytes: bytes = None, stylesheets: dict = None) -> dict:
+    """
+    Parse / AI / branding stages on already-fetched HTML, then validate and save.
+    With `capture_snapshot`, the logo and stylesheets are downloaded up front and stored with
+    the HTML in the snapshot store. Passing `logo_bytes` and `stylesheets` (as the offline
+    reprocessor does) skips those downloads entirely.
+    """
     # 3. Parser
     parsed_data = parse_html(html, base_url=final_url)
     
@@ -54,10 +66,26 @@ async def process_url(url: str) -> dict:
         raw_text=parsed_data.get("about", "")
     )
     
+    # 3.7 Snapshot raw inputs so later parser/prompt changes can be replayed offline
+    if capture_snapshot:
+        logo_bytes, stylesheets = fetch_branding_assets(html, parsed_data.get("logo_url"), final_url)
+        save_snapshot(
+            url=normalized_url,
+            final_url=final_url,
+            html=html,
+            is_dynamic=is_dynamic,
+            logo_url=parsed_data.get("logo_url"),
+            logo_bytes=logo_bytes,
+            stylesheets=stylesheets
+        )
+
     # 3.8 Branding Intelligence (Colors & Fonts)
     brand_data = enhance_branding(
         html=html,
-        logo_url=parsed_data.get("logo_url")
+        logo_url=parsed_data.get("logo_url"),
+        base_url=final_url,
+        logo_bytes=logo_bytes,
+        stylesheets=stylesheets
     )
     
     # 4. Normalization and Structuring
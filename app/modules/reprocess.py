@@ -0,0 +1,64 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from loguru import logger
+
+from app.modules.snapshot import latest_snapshots, load_snapshot, apply_retention
+from app.modules.validator import normalize_url
+
+def reprocess_entry(entry: dict) -> dict:
+    """Rerun parse / AI / branding for one snapshot. No crawling; the LLM and MongoDB are still used."""
+    # Imported in the worker so the parent process stays light
+    from app.modules.orchestrator import process_html
+
+    url = entry["url"]
+    try:
+        snapshot = load_snapshot(entry)
+        # An empty dict / b"" tells the branding stage not to fetch anything that wasn't captured
+        result = process_html(
+            normalized_url=url,
+            html=snapshot["html"],
+            final_url=snapshot["final_url"],
+            is_dynamic=snapshot["is_dynamic"],
+            logo_bytes=snapshot["logo_bytes"] or b"",
+            stylesheets=snapshot["stylesheets"]
+        )
+        return {"url": url, "snapshot_id": entry["id"], "success": result["success"], "error": result.get("error")}
+    except Exception as e:
+        logger.error(f"Reprocessing snapshot {entry.get('id')} for {url} failed: {e}")
+        return {"url": url, "snapshot_id": entry.get("id"), "success": False, "error": str(e)}
+
+def reprocess_snapshots(urls: list = None, workers: int = None) -> dict:
+    """Reprocess the newest snapshot of every (or each given) URL in parallel across cores."""
+    # Snapshots are stored under the normalized URL, so "example.com/" must match "https://example.com"
+    if urls:
+        urls = [normalize_url(url.strip()) for url in urls]
+    entries = latest_snapshots(urls)
+    if not entries:
+        logger.warning("No snapshots found to reprocess.")
+        return {"total": 0, "succeeded": 0, "failed": 0, "results": []}
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(entries)))
+    logger.info(f"Reprocessing {len(entries)} snapshot(s) with {workers} worker process(es)...")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(reprocess_entry, entries))
+
+    succeeded = sum(1 for r in results if r["success"])
+    logger.success(f"Reprocessed {succeeded}/{len(results)} snapshot(s).")
+    return {"total": len(results), "succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
+if __name__ == "__main__":
+    # python -m app.modules.reprocess [--url https://example.com ...] [--workers 8] [--prune]
+    arg_parser = argparse.ArgumentParser(description="Rebuild profiles from stored snapshots without re-crawling.")
+    arg_parser.add_argument("--url", action="append", dest="urls", help="Only reprocess this source URL, normalized like scrape requests (repeatable).")
+    arg_parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    arg_parser.add_argument("--prune", action="store_true", help="Apply snapshot retention policies first.")
+    args = arg_parser.parse_args()
+
+    if args.prune:
+        apply_retention()
+    summary = reprocess_snapshots(urls=args.urls, workers=args.workers)
+    for r in summary["results"]:
+        if not r["success"]:
+            logger.error(f"{r['url']}: {r['error']}")
@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from loguru import logger
+from app.config import (
+    SNAPSHOT_DIR,
+    SNAPSHOT_ZSTD_LEVEL,
+    SNAPSHOT_MAX_AGE_DAYS,
+    SNAPSHOT_MAX_PER_URL,
+    SNAPSHOT_MAX_TOTAL_MB,
+    SNAPSHOT_PRUNE_EVERY,
+)
+
+# Layout:
+#   <SNAPSHOT_DIR>/objects/ab/abcdef...zst   zstd-compressed blobs, named by sha256 of the raw bytes
+#   <SNAPSHOT_DIR>/manifest.jsonl            one JSON line per captured page, pointing at its blobs
+#   <SNAPSHOT_DIR>/manifest.lock             advisory lock shared by every process using the store
+# Identical HTML, logos and shared CDN stylesheets are therefore stored only once.
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+_lock = threading.Lock()
+_saves_since_prune = 0
+_retention_running = threading.Event()
+
+# Unreferenced blobs younger than this are spared by the GC: they may belong
+# to a snapshot whose manifest line has not been appended yet.
+GC_GRACE_SECONDS = 600
+
+@contextmanager
+def _store_lock():
+    """
+    Exclusive lock on the store across threads *and* processes (API workers, the
+    reprocess/--prune CLI). Held for manifest appends/rewrites, blob GC and the
+    blob exists/touch check in put_object.
+    """
+    with _lock:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        with open(os.path.join(SNAPSHOT_DIR, "manifest.lock"), "a+b") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue  # LK_LOCK gives up after ~10s; keep waiting
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _objects_dir() -> str:
+    return os.path.join(SNAPSHOT_DIR, "objects")
+
+def _manifest_path() -> str:
+    return os.path.join(SNAPSHOT_DIR, "manifest.jsonl")
+
+def _object_path(digest: str) -> str:
+    return os.path.join(_objects_dir(), digest[:2], digest + ".zst")
+
+def put_object(data: bytes) -> str:
+    """Compress and store a blob, returning its content hash."""
+    import zstandard
+
+    digest = hashlib.sha256(data).hexdigest()
+    path = _object_path(digest)
+    # The exists/touch check runs under the store lock so a concurrent GC cannot
+    # delete the blob between the check and the mtime refresh.
+    with _store_lock():
+        if os.path.exists(path):
+            # Refresh mtime so the GC grace period also covers reused blobs
+            os.utime(path)
+            return digest
+
+    # Compress outside the lock; another writer may store the same blob meanwhile
+    compressed = zstandard.ZstdCompressor(level=SNAPSHOT_ZSTD_LEVEL).compress(data)
+
+    with _store_lock():
+        if os.path.exists(path):
+            os.utime(path)
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(compressed)
+        # Atomic rename so readers never see a partial blob
+        os.replace(tmp_path, path)
+    return digest
+
+def get_object(digest: str) -> bytes:
+    """Read and decompress a blob by content hash."""
+    import zstandard
+
+    with open(_object_path(digest), "rb") as f:
+        return zstandard.ZstdDecompressor().decompress(f.read())
+
+def read_manifest() -> list:
+    """Return all manifest entries, oldest first."""
+    entries = []
+    try:
+        with open(_manifest_path(), "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning("Skipping corrupt snapshot manifest line.")
+    except FileNotFoundError:
+        pass
+    return entries
+
+def _write_manifest(entries: list):
+    """Replace the manifest atomically. Caller must hold _store_lock()."""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp_path = f"{_manifest_path()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+    os.replace(tmp_path, _manifest_path())
+
+def save_snapshot(url: str, final_url: str, html: str, is_dynamic: bool,
+                  logo_url: str = None, logo_bytes: bytes = None, stylesheets: dict = None) -> dict:
+    """Store the raw inputs of one crawl so it can be reprocessed without the network."""
+    global _saves_since_prune
+    try:
+        entry = {
+            "id": uuid.uuid4().hex,
+            "url": url,
+            "final_url": final_url,
+            "is_dynamic": is_dynamic,
+            "captured_at": datetime.utcnow().isoformat(),
+            "html": put_object(html.encode("utf-8")),
+            "logo_url": logo_url,
+            "logo": put_object(logo_bytes) if logo_bytes else None,
+            # Raw bytes plus the Content-Type charset, so decoding can be redone exactly
+            "stylesheets": {
+                css_url: {"object": put_object(body), "charset": charset}
+                for css_url, (body, charset) in (stylesheets or {}).items()
+            },
+        }
+
+        with _store_lock():
+            with open(_manifest_path(), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        logger.info(f"Snapshot {entry['id']} stored for {url}")
+
+        with _lock:
+            _saves_since_prune += 1
+            should_prune = _saves_since_prune >= SNAPSHOT_PRUNE_EVERY
+        if should_prune:
+            schedule_retention()
+        return entry
+
+    except Exception as e:
+        logger.error(f"Failed to store snapshot for {url}: {e}")
+        return None
+
+def load_snapshot(entry: dict) -> dict:
+    """Materialize a manifest entry into the html / logo bytes / stylesheets it references."""
+    return {
+        "url": entry["url"],
+        "final_url": entry.get("final_url") or entry["url"],
+        "is_dynamic": entry.get("is_dynamic", False),
+        "html": get_object(entry["html"]).decode("utf-8"),
+        "logo_url": entry.get("logo_url"),
+        "logo_bytes": get_object(entry["logo"]) if entry.get("logo") else None,
+        "stylesheets": {
+            css_url: (get_object(stored["object"]), stored.get("charset"))
+            for css_url, stored in (entry.get("stylesheets") or {}).items()
+        },
+    }
+
+def latest_snapshots(urls: list = None) -> list:
+    """Newest manifest entry per URL, optionally restricted to `urls`."""
+    latest = {}
+    for entry in read_manifest():
+        if urls and entry["url"] not in urls:
+            continue
+        latest[entry["url"]] = entry
+    return list(latest.values())
+
+def _entry_objects(entry: dict) -> set:
+    digests = {entry["html"]}
+    if entry.get("logo"):
+        digests.add(entry["logo"])
+    digests.update(stored["object"] for stored in (entry.get("stylesheets") or {}).values())
+    return digests
+
+def _object_size(digest: str) -> int:
+    try:
+        return os.path.getsize(_object_path(digest))
+    except OSError:
+        return 0
+
+def schedule_retention():
+    """
+    Run apply_retention on a background thread. It rewrites the manifest and walks
+    the whole objects tree, which must not happen on the request path / event loop.
+    """
+    if _retention_running.is_set():
+        return
+
+    def run():
+        try:
+            apply_retention()
+        except Exception as e:
+            logger.error(f"Snapshot retention failed: {e}")
+        finally:
+            _retention_running.clear()
+
+    _retention_running.set()
+    threading.Thread(target=run, name="snapshot-retention", daemon=True).start()
+
+def apply_retention() -> dict:
+    """
+    Enforce the retention policy: drop entries older than SNAPSHOT_MAX_AGE_DAYS, keep at most
+    SNAPSHOT_MAX_PER_URL per URL, evict oldest entries until stored blobs fit SNAPSHOT_MAX_TOTAL_MB,
+    then delete blobs no remaining entry references.
+    """
+    global _saves_since_prune
+    with _lock:
+        _saves_since_prune = 0
+
+    with _store_lock():
+        entries = read_manifest()
+        before = len(entries)
+
+        # 1. Age
+        cutoff = (datetime.utcnow() - timedelta(days=SNAPSHOT_MAX_AGE_DAYS)).isoformat()
+        entries = [e for e in entries if e.get("captured_at", "") >= cutoff]
+
+        # 2. Per-URL count (manifest is append-only, so later lines are newer)
+        per_url = {}
+        for entry in reversed(entries):
+            per_url.setdefault(entry["url"], []).append(entry)
+        kept_ids = {e["id"] for group in per_url.values() for e in group[:SNAPSHOT_MAX_PER_URL]}
+        entries = [e for e in entries if e["id"] in kept_ids]
+
+        # 3. Total size, evicting oldest first
+        refcounts = {}
+        for entry in entries:
+            for digest in _entry_objects(entry):
+                refcounts[digest] = refcounts.get(digest, 0) + 1
+        total_bytes = sum(_object_size(d) for d in refcounts)
+        max_bytes = SNAPSHOT_MAX_TOTAL_MB * 1024 * 1024
+        while entries and total_bytes > max_bytes:
+            evicted = entries.pop(0)
+            for digest in _entry_objects(evicted):
+                refcounts[digest] -= 1
+                if refcounts[digest] == 0:
+                    del refcounts[digest]
+                    total_bytes -= _object_size(digest)
+
+        if len(entries) != before:
+            _write_manifest(entries)
+
+        # 4. Garbage-collect unreferenced blobs. Blobs are written before their manifest
+        # line, so very recent ones may belong to a snapshot that is still being saved.
+        removed_objects = 0
+        objects_dir = _objects_dir()
+        grace_cutoff = time.time() - GC_GRACE_SECONDS
+        if os.path.isdir(objects_dir):
+            for root, _dirs, files in os.walk(objects_dir):
+                for name in files:
+                    path = os.path.join(root, name)
+                    if (name.endswith(".zst") and name[:-4] not in refcounts
+                            and os.path.getmtime(path) < grace_cutoff):
+                        os.remove(path)
+                        removed_objects += 1
+
+    stats = {"entries_removed": before - len(entries), "entries_kept": len(entries),
+             "objects_removed": removed_objects, "total_bytes": total_bytes}
+    logger.info(f"Snapshot retention applied: {stats}")
+    return stats
@@ -0,0 +1,336 @@
+from collections import OrderedDict
+
+import pytest
+import requests
+
+from app.modules import host_health, crawler
+
+HOST = "example.test"
+URL = f"https://{HOST}/"
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(host_health.time, "monotonic", fake)
+    monkeypatch.setattr(host_health, "_hosts", OrderedDict())
+    monkeypatch.setattr(host_health, "BREAKER_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(host_health, "BREAKER_COOLDOWN", 60)
+    monkeypatch.setattr(host_health, "REQUEST_TIMEOUT", 15)
+    monkeypatch.setattr(host_health, "ADAPTIVE_TIMEOUT_MIN", 2.0)
+    monkeypatch.setattr(host_health, "ADAPTIVE_TIMEOUT_MULTIPLIER", 3.0)
+    monkeypatch.setattr(host_health, "HOST_HEALTH_MAX_HOSTS", 1000)
+    monkeypatch.setattr(host_health, "HOST_HEALTH_IDLE_COOLDOWNS", 12)
+    monkeypatch.setattr(host_health, "RETRY_BUDGETS", {
+        host_health.TIMEOUT: 1,
+        host_health.CONNECTION: 0,
+        host_health.SERVER_ERROR: 2,
+        host_health.CLIENT_ERROR: 0,
+    })
+    return fake
+
+def _state(host=HOST):
+    return host_health.get_host_health(host)["state"]
+
+def _open_breaker():
+    for _ in range(3):
+        host_health.record_failure(HOST, host_health.CONNECTION, "refused")
+
+def test_opens_after_threshold(clock):
+    host_health.record_failure(HOST, host_health.TIMEOUT)
+    host_health.record_failure(HOST, host_health.TIMEOUT)
+    assert _state() == host_health.CLOSED
+    assert host_health.allow_request(HOST)
+
+    host_health.record_failure(HOST, host_health.TIMEOUT)
+    assert _state() == host_health.OPEN
+    assert not host_health.allow_request(HOST)
+
+def test_success_resets_failure_count(clock):
+    host_health.record_failure(HOST, host_health.TIMEOUT)
+    host_health.record_failure(HOST, host_health.TIMEOUT)
+    host_health.record_success(HOST, 0.2)
+    host_health.record_failure(HOST, host_health.TIMEOUT)
+    assert _state() == host_health.CLOSED
+
+def test_half_open_allows_a_single_probe(clock):
+    _open_breaker()
+    clock.now += 59
+    assert not host_health.allow_request(HOST)
+
+    clock.now += 1
+    assert host_health.allow_request(HOST)
+    assert _state() == host_health.HALF_OPEN
+    assert not host_health.allow_request(HOST)
+
+    host_health.record_success(HOST, 0.3)
+    assert _state() == host_health.CLOSED
+    assert host_health.allow_request(HOST)
+
+def test_failed_probe_reopens(clock):
+    _open_breaker()
+    clock.now += 60
+    assert host_health.allow_request(HOST)
+
+    host_health.record_failure(HOST, host_health.TIMEOUT)
+    assert _state() == host_health.OPEN
+    assert not host_health.allow_request(HOST)
+
+def test_stale_probe_is_replaced(clock):
+    _open_breaker()
+    clock.now += 60
+    assert host_health.allow_request(HOST)
+    # The probe never reports back
+    clock.now += 30
+    assert not host_health.allow_request(HOST)
+    clock.now += 30
+    assert host_health.allow_request(HOST)
+
+def test_client_error_closes_breaker(clock):
+    _open_breaker()
+    clock.now += 60
+    assert host_health.allow_request(HOST)
+
+    host_health.record_failure(HOST, host_health.CLIENT_ERROR, "404")
+    health = host_health.get_host_health(HOST)
+    assert health["state"] == host_health.CLOSED
+    assert health["consecutive_failures"] == 0
+
+def test_adaptive_timeout_follows_p95(clock):
+    assert host_health.get_timeout(HOST) == 15.0
+    for latency in [0.1, 0.2, 0.2, 0.3, 1.0]:
+        host_health.record_success(HOST, latency)
+    assert host_health.get_timeout(HOST) == 3.0   # p95 1.0s x 3
+    assert host_health.get_timeout(HOST, "dynamic") == 15.0
+
+    for _ in range(5):
+        host_health.record_success("fast.test", 0.01)
+    assert host_health.get_timeout("fast.test") == 2.0   # floored at ADAPTIVE_TIMEOUT_MIN
+
+def test_fail_fast_does_not_track_unknown_hosts(clock):
+    assert host_health.allow_request("unknown.test")
+    host_health.get_timeout("unknown.test")
+    assert host_health.get_host_health() == []
+
+def test_closed_hosts_are_evicted_lru_first(clock, monkeypatch):
+    monkeypatch.setattr(host_health, "HOST_HEALTH_MAX_HOSTS", 3)
+    _open_breaker()
+    host_health.record_success("a.test", 0.1)
+    host_health.record_success("b.test", 0.1)
+    host_health.record_success("c.test", 0.1)
+
+    hosts = [h["host"] for h in host_health.get_host_health()]
+    assert hosts == [HOST, "b.test", "c.test"]  # the open breaker survives
+
+def test_idle_hosts_are_evicted(clock):
+    host_health.record_success("a.test", 0.1)
+    clock.now += 12 * 60 + 1
+    host_health.record_success("b.test", 0.1)
+    assert [h["host"] for h in host_health.get_host_health()] == ["b.test"]
+
+def test_idle_open_breakers_are_evicted(clock):
+    _open_breaker()
+    host_health.record_success("a.test", 0.1)
+    clock.now += 12 * 60 + 1
+    host_health.record_success("b.test", 0.1)
+    assert [h["host"] for h in host_health.get_host_health()] == ["b.test"]
+
+def test_open_breakers_respect_hard_cap(clock, monkeypatch):
+    monkeypatch.setattr(host_health, "HOST_HEALTH_MAX_HOSTS", 2)
+    for host in ["a.test", "b.test", "c.test"]:
+        host_health.record_failure(host, host_health.SERVER_ERROR)
+        host_health.record_failure(host, host_health.SERVER_ERROR)
+        host_health.record_failure(host, host_health.SERVER_ERROR)
+    assert [h["host"] for h in host_health.get_host_health()] == ["b.test", "c.test"]
+
+class FakeGet:
+    """Stand-in for requests.get that plays back a scripted list of outcomes."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.timeouts = []
+
+    def __call__(self, url, headers=None, timeout=None, verify=True):
+        self.timeouts.append(timeout)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = requests.Response()
+        response.status_code = outcome
+        response.url = url
+        response._content = b"<html></html>"
+        return response
+
+@pytest.fixture
+def fake_get(clock, monkeypatch):
+    monkeypatch.setattr(crawler, "ensure_delay", lambda: None)
+    monkeypatch.setattr(crawler, "REQUEST_TIMEOUT", 15)
+
+    def install(outcomes):
+        fake = FakeGet(outcomes)
+        monkeypatch.setattr(crawler.requests, "get", fake)
+        return fake
+    return install
+
+def test_connection_error_is_not_retried(fake_get):
+    fake = fake_get([requests.exceptions.ConnectionError("refused")])
+    result = crawler.static_crawl(URL)
+    assert len(fake.timeouts) == 1
+    assert result == {"success": False, "error": "refused", "status_code": None}
+
+def test_timeout_retried_once_with_full_timeout(fake_get):
+    for _ in range(5):
+        host_health.record_success(HOST, 0.5)
+    fake = fake_get([requests.exceptions.ConnectTimeout("slow"), requests.exceptions.ConnectTimeout("slow")])
+    result = crawler.static_crawl(URL)
+    assert fake.timeouts == [2.0, 15]
+    assert result["error"] == "slow"
+
+def test_server_errors_use_their_budget(fake_get):
+    fake = fake_get([500, 503, 200])
+    result = crawler.static_crawl(URL)
+    assert len(fake.timeouts) == 3
+    assert result["success"]
+
+def test_client_error_is_not_retried(fake_get):
+    fake = fake_get([404])
+    result = crawler.static_crawl(URL)
+    assert len(fake.timeouts) == 1
+    assert result["status_code"] == 404
+
+def test_open_circuit_fails_fast(fake_get):
+    _open_breaker()
+    fake = fake_get([200])
+    result = crawler.static_crawl(URL)
+    assert fake.timeouts == []
+    assert result["error"] == f"Circuit open for {HOST}"
+
+def test_breaker_opening_mid_crawl_stops_retries(fake_get, monkeypatch):
+    monkeypatch.setattr(host_health, "BREAKER_FAILURE_THRESHOLD", 2)
+    fake = fake_get([500, 500, 200])
+    result = crawler.static_crawl(URL)
+    assert len(fake.timeouts) == 2
+    assert not result["success"]
+
+class FailingPlaywright:
+    """async_playwright() stand-in whose Chromium never launches."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @property
+    def chromium(self):
+        return self
+
+    async def launch(self, **kwargs):
+        raise RuntimeError("Executable doesn't exist")
+
+def test_browser_failure_releases_half_open_probe(clock, monkeypatch):
+    import asyncio
+    import playwright.async_api
+
+    monkeypatch.setattr(crawler, "ensure_delay", lambda: None)
+    monkeypatch.setattr(playwright.async_api, "async_playwright", FailingPlaywright)
+    _open_breaker()
+    clock.now += 60
+
+    result = asyncio.run(crawler.dynamic_crawl(URL))
+
+    assert result["error"] == "Executable doesn't exist"
+    assert _state() == host_health.HALF_OPEN
+    assert host_health.allow_request(HOST)  # probe handed back, no second cooldown
+
+class FakeBrowser:
+    """
+    async_playwright() stand-in whose page.goto plays back scripted outcomes:
+    an exception to raise, or an HTTP status. Counts the contexts it opens.
+    """
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.contexts = 0
+        self.url = URL
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @property
+    def chromium(self):
+        return self
+
+    async def launch(self, **kwargs):
+        return self
+
+    async def new_context(self, **kwargs):
+        self.contexts += 1
+        return self
+
+    async def new_page(self):
+        return self
+
+    async def goto(self, url, **kwargs):
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        self.status = outcome
+        return self
+
+    async def content(self):
+        return "<html></html>"
+
+    async def close(self):
+        pass
+
+@pytest.fixture
+def fake_browser(clock, monkeypatch):
+    import playwright.async_api
+
+    monkeypatch.setattr(crawler, "ensure_delay", lambda: None)
+    monkeypatch.setattr(host_health, "RETRY_BUDGETS", {**host_health.RETRY_BUDGETS, host_health.BROWSER_ERROR: 1})
+
+    def install(outcomes):
+        fake = FakeBrowser(outcomes)
+        monkeypatch.setattr(playwright.async_api, "async_playwright", lambda: fake)
+        return fake
+    return install
+
+def test_browser_errors_are_retried_without_penalty(fake_browser):
+    import asyncio
+    from playwright.async_api import Error as PlaywrightError
+
+    fake = fake_browser([PlaywrightError("Target page, context or browser has been closed"), 200])
+    result = asyncio.run(crawler.dynamic_crawl(URL))
+
+    assert result["success"]
+    assert fake.contexts == 2  # retried in a fresh context
+    health = host_health.get_host_health(HOST)
+    assert health["errors"][host_health.BROWSER_ERROR] == 1
+    assert health["consecutive_failures"] == 0
+
+def test_browser_errors_do_not_open_breaker(clock):
+    for _ in range(5):
+        host_health.record_failure(HOST, host_health.BROWSER_ERROR, "page crashed")
+    assert _state() == host_health.CLOSED
+
+def test_net_errors_count_as_connection_errors(fake_browser):
+    import asyncio
+    from playwright.async_api import Error as PlaywrightError
+
+    fake = fake_browser([PlaywrightError("page.goto: net::ERR_CONNECTION_REFUSED at " + URL), 200])
+    result = asyncio.run(crawler.dynamic_crawl(URL))
+
+    assert not result["success"]
+    assert fake.contexts == 1  # connection errors have no retry budget
+    assert host_health.get_host_health(HOST)["consecutive_failures"] == 1
@@ -0,0 +1,139 @@
+import os
+import json
+
+import pytest
+import requests
+
+from app.modules import snapshot, orchestrator, reprocess
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(snapshot, "GC_GRACE_SECONDS", 0)
+    monkeypatch.setattr(snapshot, "SNAPSHOT_MAX_AGE_DAYS", 30)
+    monkeypatch.setattr(snapshot, "SNAPSHOT_MAX_PER_URL", 3)
+    monkeypatch.setattr(snapshot, "SNAPSHOT_MAX_TOTAL_MB", 1024)
+    monkeypatch.setattr(snapshot, "SNAPSHOT_PRUNE_EVERY", 10_000)
+    return tmp_path / "snapshots"
+
+def _blob_count(store) -> int:
+    return sum(len(files) for _root, _dirs, files in os.walk(store / "objects"))
+
+def test_put_get_round_trip(store):
+    data = b"<html>" + os.urandom(1000) + b"</html>"
+    digest = snapshot.put_object(data)
+    assert snapshot.get_object(digest) == data
+
+def test_identical_blobs_are_stored_once(store):
+    first = snapshot.put_object(b"body{color:#635bff}")
+    second = snapshot.put_object(b"body{color:#635bff}")
+    assert first == second
+    assert _blob_count(store) == 1
+
+def test_retention_keeps_newest_per_url(store):
+    ids = [snapshot.save_snapshot("https://a.test", "https://a.test/", f"<p>{i}</p>", False)["id"] for i in range(5)]
+    snapshot.save_snapshot("https://b.test", "https://b.test/", "<p>b</p>", False)
+
+    stats = snapshot.apply_retention()
+
+    kept = [e["id"] for e in snapshot.read_manifest() if e["url"] == "https://a.test"]
+    assert kept == ids[-3:]
+    assert stats["entries_removed"] == 2
+    # The two dropped pages' HTML blobs are garbage-collected
+    assert stats["objects_removed"] == 2
+    assert _blob_count(store) == 4
+
+def test_retention_drops_old_entries(store):
+    snapshot.save_snapshot("https://old.test", "https://old.test/", "<p>old</p>", False)
+    snapshot.save_snapshot("https://new.test", "https://new.test/", "<p>new</p>", False)
+    entries = snapshot.read_manifest()
+    entries[0]["captured_at"] = "2000-01-01T00:00:00"
+    with snapshot._store_lock():
+        snapshot._write_manifest(entries)
+
+    snapshot.apply_retention()
+
+    assert [e["url"] for e in snapshot.read_manifest()] == ["https://new.test"]
+
+def test_retention_enforces_total_size(store, monkeypatch):
+    for i in range(3):
+        # Random bytes don't compress, so each blob is ~10 KB on disk
+        snapshot.save_snapshot(f"https://{i}.test", "x", "<p>x</p>", False, logo_bytes=os.urandom(10_000))
+    monkeypatch.setattr(snapshot, "SNAPSHOT_MAX_TOTAL_MB", 25_000 / (1024 * 1024))
+
+    stats = snapshot.apply_retention()
+
+    assert [e["url"] for e in snapshot.read_manifest()] == ["https://1.test", "https://2.test"]
+    assert stats["total_bytes"] <= 25_000
+    # Only the evicted logo goes; the identical HTML blob is still referenced
+    assert stats["objects_removed"] == 1
+
+def test_manifest_lines_survive_retention_rewrite(store):
+    snapshot.save_snapshot("https://a.test", "x", "<p>a</p>", False)
+    snapshot.apply_retention()
+    snapshot.save_snapshot("https://b.test", "x", "<p>b</p>", False)
+    with open(store / "manifest.jsonl") as f:
+        assert [json.loads(line)["url"] for line in f] == ["https://a.test", "https://b.test"]
+
+@pytest.fixture
+def offline(monkeypatch):
+    """Record any HTTP call and stub out the LLM and database."""
+    calls = []
+    monkeypatch.setattr(requests, "get", lambda *args, **kwargs: calls.append(args) or pytest.fail("network used"))
+    monkeypatch.setattr(orchestrator, "analyze_business_profile", lambda **kwargs: {})
+    saved = {}
+    monkeypatch.setattr(orchestrator, "save_profile", lambda url, data: saved.update({url: data}))
+    return calls, saved
+
+HTML = (
+    '<html><head><title>Acme</title><link rel="stylesheet" href="/site.css"></head>'
+    '<body><header><img class="logo" src="/logo.png"></header><h1>Acme</h1></body></html>'
+)
+
+def test_process_html_offline_makes_no_requests(offline):
+    calls, saved = offline
+    result = orchestrator.process_html("https://acme.test", HTML, "https://acme.test/", False,
+                                       logo_bytes=b"", stylesheets={})
+    assert result["success"]
+    assert calls == []
+    assert saved["https://acme.test"]["branding"]["logo_url"] == "https://acme.test/logo.png"
+
+def test_reprocess_entry_uses_stored_stylesheets(store, offline):
+    calls, saved = offline
+    entry = snapshot.save_snapshot(
+        "https://acme.test", "https://acme.test/", HTML, False,
+        logo_url="https://acme.test/logo.png",
+        stylesheets={"https://acme.test/site.css": ('body{font-family:"Café Sans";color:#ff6600}'.encode(), None)},
+    )
+
+    result = reprocess.reprocess_entry(entry)
+
+    assert result["success"]
+    assert calls == []
+    branding = saved["https://acme.test"]["branding"]
+    assert branding["fonts"] == ["Café Sans"]
+    assert branding["primary_color"] == "#ff6600"
+
+class _InlinePool:
+    """ProcessPoolExecutor stand-in that runs in-process, so monkeypatches apply."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def map(self, fn, items):
+        return map(fn, items)
+
+def test_reprocess_url_filter_is_normalized(store, monkeypatch):
+    snapshot.save_snapshot("https://acme.test", "https://acme.test/", HTML, False)
+    snapshot.save_snapshot("https://other.test", "https://other.test/", HTML, False)
+    selected = []
+    monkeypatch.setattr(reprocess, "ProcessPoolExecutor", lambda max_workers: _InlinePool())
+    monkeypatch.setattr(reprocess, "reprocess_entry", lambda entry: selected.append(entry["url"]) or {"success": True})
+
+    summary = reprocess.reprocess_snapshots(urls=["acme.test/"])
+
+    assert summary["total"] == 1
+    assert selected == ["https://acme.test"]
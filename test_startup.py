@@ -0,0 +1,32 @@
+import json
+import subprocess
+import sys
+
+# Importing the API must stay cheap: every replica and worker pays it.
+# Measured ~0.3s after the lazy-import refactor (was ~1.5s); keep headroom for slow CI.
+IMPORT_TIME_BUDGET = 1.0
+
+# Dependencies that must only be loaded once a scrape actually needs them
+HEAVY_MODULES = ["playwright", "openai", "colorthief", "PIL", "bs4", "lxml", "pymongo", "tinycss2"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({"elapsed": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+def _probe_import() -> dict:
+    # Fresh interpreter so modules cached by other tests don't skew the result
+    output = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+def test_app_import_skips_heavy_dependencies():
+    result = _probe_import()
+    assert result["loaded"] == [], f"Heavy modules imported at startup: {result['loaded']}"
+
+def test_app_import_time_budget():
+    # Best of three to smooth out cold disk caches
+    elapsed = min(_probe_import()["elapsed"] for _ in range(3))
+    assert elapsed < IMPORT_TIME_BUDGET, f"Importing app.main took {elapsed:.2f}s (budget {IMPORT_TIME_BUDGET}s)"
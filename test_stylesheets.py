@@ -0,0 +1,234 @@
+from collections import OrderedDict
+
+import pytest
+import requests
+import tinycss2
+from bs4 import BeautifulSoup
+
+from app.modules import branding
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def cache(monkeypatch):
+    """Empty stylesheet caches and a controllable clock."""
+    clock = FakeClock()
+    monkeypatch.setattr(branding.time, "monotonic", clock)
+    monkeypatch.setattr(branding, "_analysis_cache", OrderedDict())
+    monkeypatch.setattr(branding, "_url_index", OrderedDict())
+    monkeypatch.setattr(branding, "_raw_cache", OrderedDict())
+    monkeypatch.setattr(branding, "_raw_cache_bytes", 0)
+    monkeypatch.setattr(branding, "STYLESHEET_CACHE_TTL", 3600)
+    monkeypatch.setattr(branding, "STYLESHEET_FAILURE_TTL", 300)
+    monkeypatch.setattr(branding, "STYLESHEET_TIMEOUT", 10)
+    return clock
+
+class FakeResponse:
+    def __init__(self, body: bytes, content_type: str = "text/css", chunk_size: int = 4, clock=None, chunk_delay=0):
+        self.body = body
+        self.headers = {"Content-Type": content_type, "Content-Length": str(len(body))}
+        self.chunk_size = chunk_size
+        self.clock = clock
+        self.chunk_delay = chunk_delay
+        self.chunks_read = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=None):
+        for i in range(0, len(self.body), self.chunk_size):
+            self.chunks_read += 1
+            if self.clock:
+                self.clock.now += self.chunk_delay
+            yield self.body[i:i + self.chunk_size]
+
+class FakeGet:
+    """Stand-in for requests.get returning one scripted response (or exception) per URL."""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+
+    def __call__(self, url, **kwargs):
+        self.calls.append(url)
+        response = self.responses[url]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+@pytest.fixture
+def fake_get(monkeypatch):
+    def install(responses):
+        fake = FakeGet(responses)
+        monkeypatch.setattr(branding.requests, "get", fake)
+        return fake
+    return install
+
+# Parsing
+
+def test_fonts_and_colors_inside_nested_at_rules():
+    css = """
+    @media (min-width: 600px) {
+        @supports (display: grid) {
+            .hero { font-family: "Brand Display", serif; background: linear-gradient(#635BFF, #0a2540); }
+        }
+    }
+    @font-face { font-family: 'Brand Display'; src: url(brand.woff2); }
+    """
+    result = branding.analyze_css(css)
+    assert result["fonts"] == {"Brand Display": 2}
+    assert result["colors"] == {"#635bff": 1, "#0a2540": 1}
+
+def test_var_fallbacks_and_rgb_functions():
+    css = """
+    :root { --brand: #f60; }
+    a { color: var(--brand, #ff6600); border-color: rgb(10, 20, 30); outline-color: rgba(100%, 0%, 0%, .5); }
+    p { font-family: var(--body-font), Georgia; }
+    """
+    result = branding.analyze_css(css)
+    assert result["colors"] == {"#ff6600": 2, "#0a141e": 1, "#ff0000": 1}
+    assert result["fonts"] == {}
+
+def test_generic_fonts_are_dropped():
+    css = "body { font-family: system-ui, sans-serif } h1 { font-family: -apple-system, Inter } p { font-family: inherit }"
+    assert branding.analyze_css(css)["fonts"] == {}
+
+def test_first_font_family():
+    def first(value):
+        return branding._first_font_family(tinycss2.parse_component_value_list(value))
+
+    assert first('"Open Sans", Arial') == "Open Sans"
+    assert first("Open Sans, Arial") == "Open Sans"
+    assert first("  Inter") == "Inter"
+    assert first('"", Arial') is None
+    assert first("var(--font)") is None
+
+def test_normalize_hex():
+    assert branding._normalize_hex("FFF") == "#ffffff"
+    assert branding._normalize_hex("abcd") == "#aabbcc"
+    assert branding._normalize_hex("635BFF") == "#635bff"
+    assert branding._normalize_hex("635bff80") == "#635bff"
+    assert branding._normalize_hex("12345") is None
+    assert branding._normalize_hex("zzzzzz") is None
+
+def test_rgb_function_to_hex():
+    def convert(value):
+        return branding._rgb_function_to_hex(tinycss2.parse_one_component_value(value))
+
+    assert convert("rgb(255, 102, 0)") == "#ff6600"
+    assert convert("rgb(255 102 0 / 50%)") == "#ff6600"
+    assert convert("rgb(300, -5, 0)") == "#ff0000"
+    assert convert("rgb(255, 102)") is None
+
+# Decoding
+
+def test_decoding_without_charset_is_utf8():
+    body = 'body { font-family: "Café Sans" }'.encode("utf-8")
+    assert branding.analyze_css_bytes(body)["fonts"] == {"Café Sans": 1}
+
+def test_decoding_follows_charset_rule():
+    body = '@charset "iso-8859-1"; body { font-family: "Café Sans" }'.encode("latin-1")
+    assert branding.analyze_css_bytes(body)["fonts"] == {"Café Sans": 1}
+
+def test_decoding_bom_wins_over_declared_charset():
+    body = b"\xef\xbb\xbf" + 'body { font-family: "Café Sans" }'.encode("utf-8")
+    assert branding.analyze_css_bytes(body, charset="iso-8859-1")["fonts"] == {"Café Sans": 1}
+
+def test_content_type_charset():
+    assert branding._content_type_charset("text/css; charset=ISO-8859-1") == "ISO-8859-1"
+    assert branding._content_type_charset('text/css; charset="utf-8"') == "utf-8"
+    assert branding._content_type_charset("text/css") is None
+    assert branding._content_type_charset(None) is None
+
+# Fetching
+
+def test_fetch_truncates_at_max_bytes(cache, fake_get, monkeypatch):
+    monkeypatch.setattr(branding, "STYLESHEET_MAX_BYTES", 10)
+    response = FakeResponse(b"a{color:#fff}" * 100, content_type="text/css; charset=utf-8")
+    fake_get({"https://cdn.test/a.css": response})
+
+    body, charset = branding._fetch_stylesheet("https://cdn.test/a.css")
+
+    assert body == b"a{color:#f"
+    assert charset == "utf-8"
+    assert response.chunks_read == 3  # stopped reading once the cap was hit
+
+def test_fetch_enforces_wall_clock_deadline(cache, fake_get):
+    # Every chunk arrives just within the per-read timeout, but the total runs long
+    fake_get({"https://slow.test/a.css": FakeResponse(b"a{color:#fff}" * 10, clock=cache, chunk_delay=4)})
+    with pytest.raises(requests.exceptions.Timeout):
+        branding._fetch_stylesheet("https://slow.test/a.css")
+
+def test_find_stylesheet_urls(monkeypatch):
+    monkeypatch.setattr(branding, "STYLESHEET_MAX_COUNT", 2)
+    soup = BeautifulSoup(
+        '<link rel="stylesheet" href="https://fonts.googleapis.com/css2?family=Inter">'
+        '<link rel="icon" href="/favicon.css">'
+        '<link rel="Stylesheet" href="/a.css">'
+        '<link rel="stylesheet" href="/a.css">'
+        '<link rel="stylesheet" href="data:text/css,a{}">'
+        '<link rel="stylesheet" href="b.css">'
+        '<link rel="stylesheet" href="/c.css">',
+        "lxml",
+    )
+    assert branding.find_stylesheet_urls(soup, "https://acme.test/shop/") == [
+        "https://acme.test/a.css", "https://acme.test/shop/b.css",
+    ]
+
+# Caching
+
+def test_url_cache_hit_skips_download(cache, fake_get):
+    fake = fake_get({"https://cdn.test/a.css": FakeResponse(b"a{color:#635bff}")})
+    first = branding.analyze_stylesheet_url("https://cdn.test/a.css")
+    second = branding.analyze_stylesheet_url("https://cdn.test/a.css")
+    assert first is second
+    assert fake.calls == ["https://cdn.test/a.css"]
+
+def test_content_hash_hit_shares_analysis(cache, fake_get, monkeypatch):
+    body = b"a{color:#635bff}"
+    fake_get({"https://one.test/a.css": FakeResponse(body), "https://two.test/a.css": FakeResponse(body)})
+    parsed = []
+    original = branding.analyze_css_bytes
+    monkeypatch.setattr(branding, "analyze_css_bytes", lambda *args: parsed.append(args) or original(*args))
+
+    first = branding.analyze_stylesheet_url("https://one.test/a.css")
+    second = branding.analyze_stylesheet_url("https://two.test/a.css")
+
+    assert first is second
+    assert len(parsed) == 1
+
+def test_url_cache_expires_after_ttl(cache, fake_get):
+    fake = fake_get({"https://cdn.test/a.css": FakeResponse(b"a{color:#635bff}")})
+    branding.analyze_stylesheet_url("https://cdn.test/a.css")
+    cache.now += 3601
+    branding.analyze_stylesheet_url("https://cdn.test/a.css")
+    assert len(fake.calls) == 2
+
+def test_failed_urls_are_not_retried_until_failure_ttl(cache, fake_get):
+    fake = fake_get({"https://dead.test/a.css": requests.exceptions.ConnectionError("refused")})
+    assert branding.analyze_stylesheet_url("https://dead.test/a.css") is None
+    assert branding.fetch_stylesheets(["https://dead.test/a.css"]) == {}
+    assert len(fake.calls) == 1
+
+    cache.now += 301
+    branding.analyze_stylesheet_url("https://dead.test/a.css")
+    assert len(fake.calls) == 2
+
+def test_fetch_stylesheets_reuses_raw_cache(cache, fake_get):
+    fake = fake_get({"https://cdn.test/a.css": FakeResponse(b"a{color:#635bff}", content_type="text/css; charset=utf-8")})
+    first = branding.fetch_stylesheets(["https://cdn.test/a.css"])
+    branding.analyze_stylesheet_body(*first["https://cdn.test/a.css"], url="https://cdn.test/a.css")
+    second = branding.fetch_stylesheets(["https://cdn.test/a.css"])
+    assert second == first == {"https://cdn.test/a.css": (b"a{color:#635bff}", "utf-8")}
+    assert len(fake.calls) == 1